@@ -3,11 +3,12 @@ Embedding Generator for Cloudflare Docs and Runbooks
 Generates embeddings and prepares data for Vectorize indexing
 """
 
-import json
 import os
-from typing import List, Dict, Any
+from typing import Dict, Any, Iterator, Tuple
 import hashlib
 
+import orjson
+
 
 class EmbeddingGenerator:
     """Generate embeddings for documentation"""
@@ -18,103 +19,126 @@ class EmbeddingGenerator:
         self.runbooks_dir = os.path.join(self.data_dir, 'runbooks')
         self.output_file = os.path.join(self.data_dir, 'embeddings.jsonl')
     
-    def load_documents(self) -> List[Dict[str, Any]]:
-        """Load all documentation files"""
-        documents = []
+    def _iter_files(self, directory: str, extensions: Tuple[str, ...]) -> Iterator[Tuple[str, bytes]]:
+        """Yield (filename, raw bytes) for non-empty files with matching extensions"""
+        if not os.path.isdir(directory):
+            return
         
+        # is_file() uses the file type readdir already returned on most
+        # platforms; stat() is still a syscall (cached on Windows only), but
+        # it lets empty files be skipped without opening them
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(extensions) or not entry.is_file():
+                    continue
+                if entry.stat().st_size == 0:
+                    continue
+                with open(entry.path, 'rb') as f:
+                    yield entry.name, f.read()
+    
+    def iter_documents(self) -> Iterator[Dict[str, Any]]:
+        """Yield documentation files one at a time"""
         # Load docs
-        if os.path.exists(self.docs_dir):
-            for filename in os.listdir(self.docs_dir):
-                if filename.endswith(('.md', '.txt')):
-                    filepath = os.path.join(self.docs_dir, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        documents.append({
-                            'id': self._generate_id(filename),
-                            'text': content,
-                            'metadata': {
-                                'type': 'doc',
-                                'source': 'cloudflare_docs',
-                                'title': filename.replace('.md', '').replace('.txt', '').replace('_', ' ').title(),
-                                'filename': filename,
-                            }
-                        })
+        for filename, raw in self._iter_files(self.docs_dir, ('.md', '.txt')):
+            yield {
+                'id': self._generate_id(filename),
+                'text': raw.decode('utf-8', 'replace'),
+                'metadata': {
+                    'type': 'doc',
+                    'source': 'cloudflare_docs',
+                    'title': filename.replace('.md', '').replace('.txt', '').replace('_', ' ').title(),
+                    'filename': filename,
+                }
+            }
         
         # Load runbooks
-        if os.path.exists(self.runbooks_dir):
-            for filename in os.listdir(self.runbooks_dir):
-                if filename.endswith(('.md', '.txt', '.json')):
-                    filepath = os.path.join(self.runbooks_dir, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        if filename.endswith('.json'):
-                            data = json.load(f)
-                            content = data.get('content', '')
-                            metadata = data.get('metadata', {})
-                        else:
-                            content = f.read()
-                            metadata = {}
-                        
-                        documents.append({
-                            'id': self._generate_id(filename),
-                            'text': content,
-                            'metadata': {
-                                'type': 'runbook',
-                                'source': 'security_playbooks',
-                                'title': filename.replace('.md', '').replace('.txt', '').replace('.json', '').replace('_', ' ').title(),
-                                'filename': filename,
-                                **metadata,
-                            }
-                        })
-        
-        return documents
+        for filename, raw in self._iter_files(self.runbooks_dir, ('.md', '.txt', '.json')):
+            if filename.endswith('.json'):
+                data = orjson.loads(raw)
+                content = data.get('content', '')
+                metadata = data.get('metadata', {})
+            else:
+                content = raw.decode('utf-8', 'replace')
+                metadata = {}
+            
+            yield {
+                'id': self._generate_id(filename),
+                'text': content,
+                'metadata': {
+                    'type': 'runbook',
+                    'source': 'security_playbooks',
+                    'title': filename.replace('.md', '').replace('.txt', '').replace('.json', '').replace('_', ' ').title(),
+                    'filename': filename,
+                    **metadata,
+                }
+            }
     
     def _generate_id(self, filename: str) -> str:
         """Generate unique ID for document"""
-        return hashlib.md5(filename.encode()).hexdigest()
+        return hashlib.blake2b(filename.encode(), digest_size=16).hexdigest()
     
-    def chunk_document(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-        """Split document into chunks for better retrieval"""
-        words = text.split()
-        chunks = []
+    def iter_chunks(self, text: str, chunk_size_chars: int = 3000, overlap_chars: int = 300) -> Iterator[str]:
+        """Split document into overlapping chunks for better retrieval
         
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
+        Chunks are sliced straight out of the text (about 500 words each by
+        default) and snapped to whitespace so words are not cut in half.
+        """
+        n = len(text)
+        start = 0
+        while start < n:
+            end = min(start + chunk_size_chars, n)
+            if end < n:
+                boundary = max(text.rfind(' ', start, end), text.rfind('\n', start, end))
+                if boundary > start:
+                    end = boundary
+            
+            chunk = text[start:end].strip()
             if chunk:
-                chunks.append(chunk)
-        
-        return chunks
+                yield chunk
+            if end == n:
+                break
+            
+            # Step back for the overlap, then forward to the next word start
+            start = max(end - overlap_chars, start + 1)
+            boundaries = [i for i in (text.find(' ', start, end), text.find('\n', start, end)) if i != -1]
+            if boundaries:
+                start = min(boundaries) + 1
     
-    def generate(self, chunk_docs: bool = True):
-        """Generate embeddings data file"""
-        documents = self.load_documents()
-        output_data = []
-        
-        for doc in documents:
-            if chunk_docs and len(doc['text']) > 1000:
-                # Split large documents into chunks
-                chunks = self.chunk_document(doc['text'])
-                for i, chunk in enumerate(chunks):
-                    output_data.append({
-                        'id': f"{doc['id']}_chunk_{i}",
-                        'text': chunk,
-                        'metadata': {
-                            **doc['metadata'],
-                            'chunk_index': i,
-                            'total_chunks': len(chunks),
-                        }
-                    })
-            else:
-                output_data.append(doc)
+    def _chunk_or_whole(self, doc: Dict[str, Any], chunk_docs: bool) -> Iterator[Dict[str, Any]]:
+        """Yield output entries for a document, chunking it if large"""
+        if chunk_docs and len(doc['text']) > 1000:
+            # Split large documents into chunks
+            chunks = list(self.iter_chunks(doc['text']))
+            for i, chunk in enumerate(chunks):
+                yield {
+                    'id': f"{doc['id']}_chunk_{i}",
+                    'text': chunk,
+                    'metadata': {
+                        **doc['metadata'],
+                        'chunk_index': i,
+                        'total_chunks': len(chunks),
+                    }
+                }
+        else:
+            yield doc
+    
+    def generate(self, chunk_docs: bool = True) -> int:
+        """Generate embeddings data file, streaming entries as they are produced"""
+        doc_count = 0
+        entry_count = 0
         
         # Write to JSONL
-        with open(self.output_file, 'w', encoding='utf-8') as f:
-            for item in output_data:
-                f.write(json.dumps(item) + '\n')
+        with open(self.output_file, 'wb') as f:
+            for doc in self.iter_documents():
+                doc_count += 1
+                for item in self._chunk_or_whole(doc, chunk_docs):
+                    f.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE))
+                    entry_count += 1
         
-        print(f"Generated {len(output_data)} embedding entries from {len(documents)} documents")
+        print(f"Generated {entry_count} embedding entries from {doc_count} documents")
         print(f"Output saved to: {self.output_file}")
         
-        return output_data
+        return entry_count
 
 
 def main():
@@ -3,18 +3,102 @@ Generate embeddings using Cloudflare Workers AI and upload to Vectorize
 Requires: CLOUDFLARE_ACCOUNT_ID and CF_API_TOKEN environment variables
 """
 
+import hashlib
 import json
 import os
 import requests
+import sqlite3
 import sys
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import ModuleType
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+import orjson
+
+tokenizers: Optional[ModuleType]
+try:
+    import tokenizers
+except ImportError:  # Optional: texts fall back to a character-count clamp
+    tokenizers = None
 
 # Configuration
 ACCOUNT_ID = os.getenv('CLOUDFLARE_ACCOUNT_ID')
 API_TOKEN = os.getenv('CF_API_TOKEN')
 VECTORIZE_INDEX = 'edgesec-docs'
 EMBEDDING_MODEL = '@cf/baai/bge-base-en-v1.5'
+EMBEDDING_TOKENIZER = 'BAAI/bge-base-en-v1.5'
+MAX_INPUT_TOKENS = 512  # Model context length, including [CLS]/[SEP]
+MAX_INPUT_CHARS = 2000  # Fallback limit when the tokenizer is unavailable
 EMBEDDINGS_FILE = '../data/embeddings.jsonl'
+EMBEDDING_CACHE_FILE = '../data/embedding_cache.sqlite3'
+EMBEDDING_VECTORS_FILE = '../data/embeddings.npy'
+EMBEDDING_METADATA_FILE = '../data/embeddings_meta.jsonl'
+EMBEDDING_BATCH_SIZE = 100  # Workers AI accepts up to 100 texts per request
+VECTORIZE_BATCH_SIZE = 100  # Vectorize accepts up to 100 vectors per insert
+MAX_WORKERS = 8
+
+# Shared session so concurrent calls reuse pooled TCP/TLS connections
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(['POST']),
+    ),
+))
+
+class EmbeddingCache:
+    """SQLite cache of embeddings keyed by text hash and model"""
+    
+    LOOKUP_BATCH_SIZE = 500  # Stay well under SQLite's bound-parameter limit
+    
+    def __init__(self, path: str, model: str):
+        self.model = model
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'hash BLOB NOT NULL, model TEXT NOT NULL, vec BLOB NOT NULL, '
+            'PRIMARY KEY (hash, model))'
+        )
+    
+    @staticmethod
+    def key(text: str) -> bytes:
+        """Hash text into a cache key"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Return cached embeddings for whichever keys are present"""
+        found = {}
+        for batch in chunked(list(set(keys)), self.LOOKUP_BATCH_SIZE):
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(
+                f'SELECT hash, vec FROM cache WHERE model = ? AND hash IN ({placeholders})',
+                [self.model, *batch],
+            )
+            for key, vec in rows:
+                found[key] = np.frombuffer(vec, dtype='<f4').tolist()
+        return found
+    
+    def put_many(self, embeddings: Dict[bytes, List[float]]):
+        """Store embeddings as little-endian float32 blobs"""
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO cache (hash, model, vec) VALUES (?, ?, ?)',
+                [
+                    (key, self.model, np.asarray(embedding, dtype='<f4').tobytes())
+                    for key, embedding in embeddings.items()
+                ],
+            )
+    
+    def close(self):
+        self.conn.close()
 
 def load_text_chunks() -> List[Dict[str, Any]]:
     """Load text chunks from embeddings.jsonl"""
@@ -29,8 +113,45 @@ def load_text_chunks() -> List[Dict[str, Any]]:
     print(f"Loaded {len(chunks)} text chunks")
     return chunks
 
-def generate_embedding(text: str) -> List[float]:
-    """Generate embedding using Cloudflare Workers AI"""
+def chunked(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Yield successive slices of at most `size` items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """Load the embedding model's tokenizer once, or None if it is unavailable"""
+    if tokenizers is None:
+        return None
+    
+    try:
+        tokenizer = tokenizers.Tokenizer.from_pretrained(EMBEDDING_TOKENIZER)
+    except Exception as e:
+        print(f"\n⚠️  Warning: Could not load tokenizer '{EMBEDDING_TOKENIZER}', truncating by length: {e}")
+        return None
+    
+    tokenizer.enable_truncation(max_length=MAX_INPUT_TOKENS)
+    return tokenizer
+
+def truncate_texts(texts: List[str]) -> List[str]:
+    """Truncate texts to the model's input limit"""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return [text[:MAX_INPUT_CHARS] for text in texts]
+    
+    truncated = []
+    for text, encoding in zip(texts, tokenizer.encode_batch(texts)):
+        if encoding.overflowing:
+            # Cut the original text at the end of the last token that fits
+            text = text[:max(end for _, end in encoding.offsets)]
+        truncated.append(text)
+    return truncated
+
+def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    """Generate embeddings for a batch of texts in a single Workers AI call
+    
+    Texts must already fit the model's input, e.g. via truncate_texts().
+    """
     if not ACCOUNT_ID or not API_TOKEN:
         raise ValueError("CLOUDFLARE_ACCOUNT_ID and CF_API_TOKEN must be set")
     
@@ -40,17 +161,16 @@ def generate_embedding(text: str) -> List[float]:
         'Content-Type': 'application/json'
     }
     
-    # Truncate text if too long (max ~512 tokens for most models)
-    if len(text) > 2000:
-        text = text[:2000]
+    payload = {'text': texts}
     
-    payload = {'text': text}
-    
-    response = requests.post(url, headers=headers, json=payload)
+    response = SESSION.post(url, headers=headers, json=payload)
     response.raise_for_status()
     
     result = response.json()
-    return result['result']['data'][0]
+    embeddings = result['result']['data']
+    if len(embeddings) != len(texts):
+        raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+    return embeddings
 
 def upload_to_vectorize(vectors: List[Dict[str, Any]]) -> bool:
     """Upload vectors to Vectorize index"""
@@ -64,9 +184,9 @@ def upload_to_vectorize(vectors: List[Dict[str, Any]]) -> bool:
     }
     
     # Convert to NDJSON format
-    ndjson_data = '\n'.join(json.dumps(v) for v in vectors)
+    ndjson_data = b''.join(orjson.dumps(v, option=orjson.OPT_APPEND_NEWLINE) for v in vectors)
     
-    response = requests.post(url, headers=headers, data=ndjson_data)
+    response = SESSION.post(url, headers=headers, data=ndjson_data)
     response.raise_for_status()
     
     result = response.json()
@@ -90,48 +210,94 @@ def main():
         # Load text chunks
         chunks = load_text_chunks()
         
-        # Generate embeddings for each chunk
-        vectors = []
-        for i, chunk in enumerate(chunks):
-            print(f"Generating embedding {i+1}/{len(chunks)}...", end='\r')
-            
-            try:
-                embedding = generate_embedding(chunk['text'])
-                vectors.append({
-                    'id': chunk['id'],
-                    'values': embedding,
-                    'metadata': chunk.get('metadata', {})
-                })
-            except Exception as e:
-                print(f"\n⚠️  Warning: Failed to generate embedding for {chunk['id']}: {e}")
-                continue
+        # Key the cache on the text actually sent, so changing how texts are
+        # truncated never reuses embeddings of differently truncated text
+        texts = truncate_texts([chunk['text'] for chunk in chunks])
         
-        print(f"\n✓ Generated {len(vectors)} embeddings")
+        # Reuse cached embeddings for chunks whose text has not changed
+        cache = EmbeddingCache(os.path.join(os.path.dirname(__file__), EMBEDDING_CACHE_FILE), EMBEDDING_MODEL)
+        keys = [EmbeddingCache.key(text) for text in texts]
+        embeddings = cache.get_many(keys)
+        pending = [i for i, key in enumerate(keys) if key not in embeddings]
+        print(f"Found {len(chunks) - len(pending)} cached embeddings, {len(pending)} to generate")
         
-        # Upload to Vectorize in batches (API limit: 100 vectors per request)
-        batch_size = 100
-        total_batches = (len(vectors) + batch_size - 1) // batch_size
+        def to_vector(i: int, embedding: List[float]) -> Dict[str, Any]:
+            return {
+                'id': chunks[i]['id'],
+                'values': embedding,
+                'metadata': chunks[i].get('metadata', {})
+            }
         
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            print(f"Uploading batch {batch_num}/{total_batches} ({len(batch)} vectors)...", end='\r')
+        def embed_and_upload(batch: List[int]) -> Tuple[Dict[bytes, List[float]], Optional[Exception]]:
+            """Embed a batch of chunks and upload it as soon as it is ready
+            
+            Returns the new embeddings with the upload error, if any, so the
+            embeddings are cached even when their upload fails.
+            """
+            try:
+                batch_embeddings = generate_embeddings_batch([texts[i] for i in batch])
+            except Exception as e:
+                batch_ids = ', '.join(chunks[i]['id'] for i in batch)
+                print(f"\n⚠️  Warning: Failed to generate embeddings for chunks {batch_ids}: {e}")
+                return {}, None
             
+            new_embeddings = {keys[i]: embedding for i, embedding in zip(batch, batch_embeddings)}
             try:
-                upload_to_vectorize(batch)
+                upload_to_vectorize([to_vector(i, embedding) for i, embedding in zip(batch, batch_embeddings)])
             except Exception as e:
-                print(f"\n❌ Error uploading batch {batch_num}: {e}")
-                sys.exit(1)
+                return new_embeddings, e
+            return new_embeddings, None
+        
+        # Generate embeddings in batches (API limit: 100 texts per request) and
+        # upload each batch as it completes, so embedding and insert calls overlap
+        cached = [i for i, key in enumerate(keys) if key in embeddings]
+        embed_batches = list(chunked(pending, EMBEDDING_BATCH_SIZE))
+        upload_batches = list(chunked(cached, VECTORIZE_BATCH_SIZE))
+        print(f"Embedding and uploading {len(embed_batches)} batches, "
+              f"uploading {len(upload_batches)} cached batches ({MAX_WORKERS} in flight)...")
+        
+        fresh = {}
+        upload_errors = []
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            upload_futures = [
+                executor.submit(upload_to_vectorize, [to_vector(i, embeddings[keys[i]]) for i in batch])
+                for batch in upload_batches
+            ]
+            embed_futures = [executor.submit(embed_and_upload, batch) for batch in embed_batches]
+            
+            for future in upload_futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    upload_errors.append(e)
+            for future in embed_futures:
+                new_embeddings, upload_error = future.result()
+                fresh.update(new_embeddings)
+                if upload_error is not None:
+                    upload_errors.append(upload_error)
         
+        cache.put_many(fresh)
+        cache.close()
+        embeddings.update(fresh)
+        
+        if upload_errors:
+            print(f"\n❌ Error uploading {len(upload_errors)} batches: {upload_errors[0]}")
+            sys.exit(1)
+        
+        vectors = [to_vector(i, embeddings[key]) for i, key in enumerate(keys) if key in embeddings]
         print(f"\n✅ Successfully uploaded {len(vectors)} vectors to Vectorize index '{VECTORIZE_INDEX}'")
         
-        # Save embeddings locally for reference
-        output_file = os.path.join(os.path.dirname(__file__), '../data/embeddings_with_vectors.jsonl')
-        with open(output_file, 'w', encoding='utf-8') as f:
+        # Save embeddings locally for reference: a float32 matrix plus a sidecar
+        # JSONL of ids/metadata in the same row order
+        vectors_file = os.path.join(os.path.dirname(__file__), EMBEDDING_VECTORS_FILE)
+        np.save(vectors_file, np.asarray([vector['values'] for vector in vectors], dtype=np.float32))
+        
+        metadata_file = os.path.join(os.path.dirname(__file__), EMBEDDING_METADATA_FILE)
+        with open(metadata_file, 'w', encoding='utf-8') as f:
             for vector in vectors:
-                f.write(json.dumps(vector) + '\n')
+                f.write(json.dumps({'id': vector['id'], 'metadata': vector['metadata']}) + '\n')
         
-        print(f"✓ Saved embeddings to {output_file}")
+        print(f"✓ Saved embeddings to {vectors_file} (metadata: {metadata_file})")
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
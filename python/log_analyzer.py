@@ -3,13 +3,55 @@ Traffic Log Analyzer - Python Utility
 Analyzes log files and generates detailed security reports
 """
 
+import io
 import json
+import mmap
+import os
 import re
 from collections import Counter, defaultdict
 from datetime import datetime
-from typing import List, Dict, Any
+from itertools import repeat
+from types import ModuleType
+from typing import List, Dict, Any, Optional
 import sys
 
+import numpy as np
+import orjson
+import pandas as pd
+
+hyperscan: Optional[ModuleType]
+try:
+    import hyperscan
+except ImportError:  # Optional: patterns fall back to the stdlib re engine
+    hyperscan = None
+
+
+def _compile_hyperscan_db(patterns: Dict[str, re.Pattern]):
+    """Compile patterns into one Hyperscan database, or None if unavailable"""
+    if hyperscan is None:
+        return None
+    
+    regexes = list(patterns.values())
+    db = hyperscan.Database()
+    try:
+        db.compile(
+            expressions=[regex.pattern.encode() for regex in regexes],
+            ids=list(range(len(regexes))),
+            elements=len(regexes),
+            flags=[
+                hyperscan.HS_FLAG_SINGLEMATCH
+                | (hyperscan.HS_FLAG_CASELESS if regex.flags & re.IGNORECASE else 0)
+                for regex in regexes
+            ],
+        )
+    except hyperscan.error:
+        return None
+    return db
+
+
+def _on_hyperscan_match(pattern_id: int, start: int, end: int, flags: int, matched: List[int]):
+    matched.append(pattern_id)
+
 
 class TrafficAnalyzer:
     """Analyzes traffic logs for security anomalies"""
@@ -27,8 +69,32 @@ class TrafficAnalyzer:
         'xxe': re.compile(r'<!ENTITY|SYSTEM|PUBLIC', re.IGNORECASE),
     }
     
+    BOT_PATTERN = re.compile(r'bot|crawler|spider|scraper|curl|wget', re.IGNORECASE)
+    
+    # Defaults applied to missing log fields before analysis
+    FIELD_DEFAULTS = {
+        'clientIP': '',
+        'path': '',
+        'query': '',
+        'statusCode': 0,
+        'country': 'Unknown',
+        'asn': 'Unknown',
+        'userAgent': '',
+    }
+    
+    # All attack patterns as one named alternation so clean input is rejected in a
+    # single scan. Each branch keeps its own case sensitivity via a scoped flag.
+    COMBINED_PATTERN = re.compile('|'.join(
+        f"(?P<{name}>(?{'i' if regex.flags & re.IGNORECASE else '-i'}:{regex.pattern}))"
+        for name, regex in PATTERNS.items()
+    ))
+    
+    # SIMD multi-pattern matcher for all attack patterns, when hyperscan is installed
+    HYPERSCAN_DB = _compile_hyperscan_db(PATTERNS)
+    
     def __init__(self, logs: List[Dict[str, Any]]):
         self.logs = logs
+        self.df = self._build_frame(logs)
         self.analysis = {
             'total_requests': len(logs),
             'time_window': self._calculate_time_window(),
@@ -43,67 +109,135 @@ class TrafficAnalyzer:
             'recommendations': [],
         }
     
+    def _build_frame(self, logs: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Load logs into a DataFrame with defaults for missing fields"""
+        # object dtype keeps values as given; numeric columns with a missing
+        # entry would otherwise be promoted to float (13335 -> 13335.0)
+        return pd.DataFrame(logs, columns=['timestamp', *self.FIELD_DEFAULTS], dtype=object).fillna(self.FIELD_DEFAULTS)
+    
     def _calculate_time_window(self) -> Dict[str, str]:
         """Calculate time window of logs"""
-        if not self.logs:
+        timestamps = [timestamp for timestamp in self.df['timestamp'].dropna().tolist() if timestamp]
+        
+        if not timestamps:
             return {}
         
-        timestamps = [
-            datetime.fromisoformat(log.get('timestamp', '').replace('Z', '+00:00'))
-            for log in self.logs
-            if log.get('timestamp')
-        ]
+        parsed = []
+        if all(isinstance(timestamp, str) and timestamp.endswith('Z') for timestamp in timestamps):
+            # pandas parses tz-aware strings element by element, so parse
+            # Cloudflare's UTC 'Z' timestamps as naive and localize after
+            naive = pd.to_datetime(pd.Series([timestamp[:-1] for timestamp in timestamps], dtype=object),
+                                   format='ISO8601', errors='coerce')
+            valid = naive.dropna()
+            if not valid.empty:
+                parsed += [valid.min().tz_localize('UTC').to_pydatetime(warn=False),
+                           valid.max().tz_localize('UTC').to_pydatetime(warn=False)]
+            # Out-of-range dates (past 2262) are NaT here but valid ISO 8601
+            timestamps = [timestamps[i] for i in np.flatnonzero(naive.isna().to_numpy())]
         
-        if not timestamps:
+        for timestamp in timestamps:
+            try:
+                parsed.append(datetime.fromisoformat(timestamp.replace('Z', '+00:00')))
+            except (AttributeError, ValueError):
+                continue  # Skip unparseable timestamps
+        
+        if not parsed:
             return {}
+        start, end = min(parsed), max(parsed)
         
         return {
-            'start': min(timestamps).isoformat(),
-            'end': max(timestamps).isoformat(),
-            'duration_seconds': (max(timestamps) - min(timestamps)).total_seconds(),
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'duration_seconds': (end - start).total_seconds(),
         }
     
     def analyze(self) -> Dict[str, Any]:
         """Run comprehensive analysis"""
-        for log in self.logs:
-            self._analyze_log_entry(log)
+        df = self.df
         
+        # Count statistics
+        self.analysis['ip_stats'] = self._count_values(df['clientIP'])
+        self.analysis['path_stats'] = self._count_values(df['path'])
+        self.analysis['status_code_stats'] = self._count_values(df['statusCode'])
+        self.analysis['country_stats'] = self._count_values(df['country'])
+        self.analysis['asn_stats'] = self._count_values(df['asn'])
+        
+        self._detect_patterns(df)
+        self._detect_bots(df)
         self._detect_anomalies()
         self._generate_recommendations()
         
         return self.analysis
     
-    def _analyze_log_entry(self, log: Dict[str, Any]):
-        """Analyze individual log entry"""
-        path = log.get('path', '')
-        ip = log.get('clientIP', '')
-        status = log.get('statusCode', 0)
-        country = log.get('country', 'Unknown')
-        asn = log.get('asn', 'Unknown')
-        user_agent = log.get('userAgent', '')
+    @staticmethod
+    def _count_values(column: pd.Series) -> Counter:
+        """Count column values, keeping first-seen order and plain Python types"""
+        if column.dtype == object:
+            # Counter's C counting loop beats value_counts() plus the dict
+            # conversion on high-cardinality string columns (IPs, paths)
+            return Counter(column.tolist())
         
-        # Count statistics
-        self.analysis['ip_stats'][ip] += 1
-        self.analysis['path_stats'][path] += 1
-        self.analysis['status_code_stats'][status] += 1
-        self.analysis['country_stats'][country] += 1
-        self.analysis['asn_stats'][asn] += 1
+        counts = column.value_counts(sort=False)
+        return Counter(dict(zip(counts.index.tolist(), counts.tolist())))
+    
+    @staticmethod
+    def _search(column: pd.Series, regex: re.Pattern) -> pd.Series:
+        """Boolean mask of values containing a match for regex"""
+        # Log fields repeat heavily, so only run the regex once per distinct value.
+        # Dedupe with a Python set: pandas' factorize() conflates strings with NULs.
+        matched = {value for value in set(column) if regex.search(value)}
+        hits = np.fromiter(map(matched.__contains__, column), dtype=bool, count=len(column))
+        return pd.Series(hits, index=column.index)
+    
+    @staticmethod
+    def _first_seen_order(masks: Dict[str, Any]) -> List[str]:
+        """Order non-empty masks by the first row they match"""
+        hits = [(mask.argmax(), i, name) for i, (name, mask) in enumerate(masks.items()) if mask.any()]
+        return [name for _, _, name in sorted(hits)]
+    
+    def _pattern_bits(self, column: pd.Series) -> np.ndarray:
+        """Per-row bitmask of the attack patterns matching each value"""
+        # Match once per distinct value, then broadcast the bitmasks back to rows
+        bits = {}
+        for value in set(column):
+            value_bits = self._match_bits(value)
+            if value_bits:
+                bits[value] = value_bits
+        return np.fromiter(map(bits.get, column, repeat(0)), dtype=np.int64, count=len(column))
+    
+    def _match_bits(self, text: str) -> int:
+        """Bitmask of the attack patterns (in PATTERNS order) found in text"""
+        # Hyperscan works on bytes with ASCII semantics for \b, \s and case folding,
+        # which only agree with re on printable ASCII; anything else goes to re
+        if self.HYPERSCAN_DB is not None and text.isascii() and text.isprintable():
+            matched: List[int] = []
+            self.HYPERSCAN_DB.scan(text.encode('ascii'), match_event_handler=_on_hyperscan_match, context=matched)
+            return sum(1 << i for i in set(matched))
         
-        # Detect patterns
-        for pattern_name, regex in self.PATTERNS.items():
-            if regex.search(path) or regex.search(log.get('query', '')):
-                self.analysis['patterns'][pattern_name] += 1
+        # Screen with the combined pattern before trying each pattern
+        if not self.COMBINED_PATTERN.search(text):
+            return 0
+        return sum(1 << i for i, regex in enumerate(self.PATTERNS.values()) if regex.search(text))
+    
+    def _detect_patterns(self, df: pd.DataFrame):
+        """Count log entries matching each attack pattern in path or query"""
+        bits = self._pattern_bits(df['path']) | self._pattern_bits(df['query'])
         
-        # Bot detection
-        if self._is_bot(user_agent):
-            self.analysis['user_agent_stats']['bot'] += 1
-        else:
-            self.analysis['user_agent_stats']['human'] += 1
+        masks = {
+            pattern_name: (bits & (1 << i)) != 0
+            for i, pattern_name in enumerate(self.PATTERNS)
+        }
+        for pattern_name in self._first_seen_order(masks):
+            self.analysis['patterns'][pattern_name] = int(masks[pattern_name].sum())
     
-    def _is_bot(self, user_agent: str) -> bool:
+    def _detect_bots(self, df: pd.DataFrame):
         """Simple bot detection"""
-        bot_indicators = ['bot', 'crawler', 'spider', 'scraper', 'curl', 'wget']
-        return any(indicator in user_agent.lower() for indicator in bot_indicators) or len(user_agent) < 10
+        user_agent = df['userAgent']
+        is_bot = self._search(user_agent, self.BOT_PATTERN) | (user_agent.str.len() < 10)
+        
+        masks = {'bot': is_bot, 'human': ~is_bot}
+        for label in self._first_seen_order(masks):
+            self.analysis['user_agent_stats'][label] = int(masks[label].sum())
     
     def _detect_anomalies(self):
         """Detect security anomalies"""
@@ -122,13 +256,17 @@ class TrafficAnalyzer:
                 })
         
         # DDoS detection (high request rate from few IPs)
-        top_ips = self.analysis['ip_stats'].most_common(10)
-        avg_requests_per_ip = total / len(self.analysis['ip_stats']) if self.analysis['ip_stats'] else 0
+        ip_stats = self.analysis['ip_stats']
+        avg_requests_per_ip = total / len(ip_stats) if ip_stats else 0
+        ddos_threshold = avg_requests_per_ip * 5
         
+        # most_common(n) is a heap-based top-n selection and yields counts in
+        # descending order, so stop at the first IP under the threshold
         ddos_ips = []
-        for ip, count in top_ips:
-            if count > avg_requests_per_ip * 5:
-                ddos_ips.append({'ip': ip, 'requests': count})
+        for ip, count in ip_stats.most_common(10):
+            if count <= ddos_threshold:
+                break
+            ddos_ips.append({'ip': ip, 'requests': count})
         
         if ddos_ips:
             self.analysis['anomalies'].append({
@@ -204,54 +342,83 @@ class TrafficAnalyzer:
     
     def generate_report(self) -> str:
         """Generate human-readable report"""
-        report = []
-        report.append("=" * 80)
-        report.append("EDGESEC TRAFFIC ANALYSIS REPORT")
-        report.append("=" * 80)
-        report.append("")
+        heavy_rule = "=" * 80 + "\n"
+        light_rule = "-" * 80 + "\n"
+        
+        report = io.StringIO()
+        w = report.write
+        w(heavy_rule)
+        w("EDGESEC TRAFFIC ANALYSIS REPORT\n")
+        w(heavy_rule)
+        w("\n")
         
         # Summary
-        report.append("SUMMARY")
-        report.append("-" * 80)
-        report.append(f"Total Requests: {self.analysis['total_requests']}")
-        report.append(f"Unique IPs: {len(self.analysis['ip_stats'])}")
-        report.append(f"Unique Paths: {len(self.analysis['path_stats'])}")
-        report.append(f"Time Window: {self.analysis['time_window'].get('duration_seconds', 0):.0f} seconds")
-        report.append("")
+        w("SUMMARY\n")
+        w(light_rule)
+        w(f"Total Requests: {self.analysis['total_requests']}\n")
+        w(f"Unique IPs: {len(self.analysis['ip_stats'])}\n")
+        w(f"Unique Paths: {len(self.analysis['path_stats'])}\n")
+        w(f"Time Window: {self.analysis['time_window'].get('duration_seconds', 0):.0f} seconds\n")
+        w("\n")
         
         # Anomalies
         if self.analysis['anomalies']:
-            report.append("DETECTED ANOMALIES")
-            report.append("-" * 80)
+            w("DETECTED ANOMALIES\n")
+            w(light_rule)
             for anomaly in sorted(self.analysis['anomalies'], key=lambda x: x['severity'], reverse=True):
-                report.append(f"[{anomaly['severity']}] {anomaly['description']}")
+                w(f"[{anomaly['severity']}] {anomaly['description']}\n")
                 if 'details' in anomaly:
                     for detail in anomaly['details']:
-                        report.append(f"  - {detail}")
-            report.append("")
+                        w(f"  - {detail}\n")
+            w("\n")
         
         # Recommendations
         if self.analysis['recommendations']:
-            report.append("RECOMMENDATIONS")
-            report.append("-" * 80)
+            w("RECOMMENDATIONS\n")
+            w(light_rule)
             for rec in self.analysis['recommendations']:
-                report.append(f"[{rec['priority']}] {rec['description']}")
-                report.append(f"  Action: {rec['action']}")
-                report.append(f"  Rule Type: {rec['rule_type']}")
+                w(f"[{rec['priority']}] {rec['description']}\n")
+                w(f"  Action: {rec['action']}\n")
+                w(f"  Rule Type: {rec['rule_type']}\n")
                 if 'params' in rec:
-                    report.append(f"  Parameters: {rec['params']}")
-            report.append("")
+                    w(f"  Parameters: {rec['params']}\n")
+            w("\n")
         
         # Top IPs
-        report.append("TOP 10 IPS BY REQUEST COUNT")
-        report.append("-" * 80)
+        w("TOP 10 IPS BY REQUEST COUNT\n")
+        w(light_rule)
         for ip, count in self.analysis['ip_stats'].most_common(10):
-            report.append(f"{ip}: {count} requests")
-        report.append("")
+            w(f"{ip}: {count} requests\n")
+        w("\n")
         
-        report.append("=" * 80)
+        w("=" * 80)
         
-        return "\n".join(report)
+        return report.getvalue()
+
+
+def load_logs(log_file: str) -> List[Dict[str, Any]]:
+    """Load logs from a JSON array/object or NDJSON file"""
+    if os.path.getsize(log_file) == 0:
+        raise json.JSONDecodeError("Empty log file", "", 0)
+    
+    # Parse straight out of a read-only mapping instead of copying the file into memory
+    with open(log_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        try:
+            with memoryview(mm) as buf:
+                logs = orjson.loads(buf)
+        except orjson.JSONDecodeError:
+            # Anything but a stream of objects really is invalid JSON
+            first = re.search(rb'\S', mm)
+            if first is None or mm[first.start()] != ord('{'):
+                raise
+            
+            # NDJSON: one log object per line
+            logs = [orjson.loads(line) for line in iter(mm.readline, b'') if line.strip()]
+    
+    if not isinstance(logs, list):
+        logs = [logs]
+    
+    return logs
 
 
 def main():
@@ -263,11 +430,7 @@ def main():
     log_file = sys.argv[1]
     
     try:
-        with open(log_file, 'r') as f:
-            logs = json.load(f)
-        
-        if not isinstance(logs, list):
-            logs = [logs]
+        logs = load_logs(log_file)
         
         analyzer = TrafficAnalyzer(logs)
         analysis = analyzer.analyze()
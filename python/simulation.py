@@ -3,202 +3,581 @@ WAF Rule Simulator - Python Utility
 Simulates rule impact on historical traffic
 """
 
-import json
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import pickle
 import re
-from typing import List, Dict, Any
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from itertools import islice, repeat
+from types import ModuleType
+from typing import Any, Iterable, Iterator, NamedTuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+hyperscan: ModuleType | None
+try:
+    import hyperscan
+except ImportError:  # Optional: URL pattern families fall back to re
+    hyperscan = None
+
+try:
+    import ijson
+except ImportError:  # Optional: log files are parsed whole with orjson
+    ijson = None
+
+# On-disk memoization of simulation results. The cache is on by default and
+# lives under the current working directory. Entries are unpickled, so only
+# use it where nobody else can write to that directory; it is never pruned
+# (a 200k-log run stores several MB). Results are only cached for simulators
+# given a logs_digest, so library callers never pay to hash their logs; pass
+# e.g. hashlib.sha256(orjson.dumps(logs)).digest() to opt in. Keys include a
+# digest of this module's source, so editing it invalidates earlier results.
+SIM_CACHE_DIR = os.path.join('.cache', 'waf_sim')
+SIM_CACHE_DISABLE_ENV = 'WAF_SIM_NO_CACHE'  # Set to disable, e.g. in CI
+
+
+# Pattern families, each compiled once into a single alternation. Patterns
+# matched case-insensitively are lowercase and run against lowercased text.
+_TRAVERSAL_RE = re.compile(r'\.\.|%2e%2e')
+_SQLI_RE = re.compile(r"union select|drop table|' or '1'='1")
+_XSS_RE = re.compile(r'<script|javascript:|onerror=')
+_SUSPICIOUS_PATH_RE = re.compile(r'admin|wp-|phpmyadmin|\.env')
+_THREAT_UA_RE = re.compile(r'bot|curl')
+_BOT_UA_RE = re.compile(r'bot|crawler|spider')
+_SCRIPT_TOOL_RE = re.compile(r'curl|wget')
+_COMMON_PATH_RE = re.compile(r'/api/|/static/|/assets/')
+_BROWSER_RE = re.compile(r'Chrome/|Firefox/|Safari/')
+_VERSION_RE = re.compile(r'\d+\.\d+')
+
+# Families matched against the lowercased request URL
+_URL_FAMILIES = [_TRAVERSAL_RE, _SQLI_RE, _XSS_RE]
+
+
+def _compile_hyperscan_db(patterns: list[re.Pattern]):
+    """Compile patterns into one Hyperscan database, or None if unavailable"""
+    if hyperscan is None:
+        return None
+    
+    db = hyperscan.Database()
+    try:
+        db.compile(
+            expressions=[regex.pattern.encode() for regex in patterns],
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(patterns),
+        )
+    except hyperscan.error:
+        return None
+    return db
+
+
+def _on_hyperscan_match(pattern_id: int, start: int, end: int, flags: int, matched: list[int]):
+    matched.append(pattern_id)
+
+
+_URL_FAMILIES_DB = _compile_hyperscan_db(_URL_FAMILIES)
+
+
+class _ExpressionPlan(NamedTuple):
+    """Checks enabled by a rule expression"""
+    check_traversal: bool
+    check_sqli: bool
+    check_xss: bool
+    threat_gt: int | None
+    bot_lt: int | None
+    country: str | None
+    
+    def is_empty(self) -> bool:
+        """True if the expression enables no checks, so nothing can match"""
+        return (
+            not (self.check_traversal or self.check_sqli or self.check_xss)
+            and self.threat_gt is None
+            and self.bot_lt is None
+            and self.country is None
+        )
+
+
+class _TextColumn(NamedTuple):
+    """Text field stored as row codes into its distinct values"""
+    codes: np.ndarray
+    values: list[str]
+    lowered: list[str]
+    
+    @classmethod
+    def encode(cls, column: pd.Series) -> _TextColumn:
+        # Log fields repeat heavily, so work is done once per distinct value
+        index: dict[str, int] = {}
+        codes = np.fromiter(
+            (index.setdefault(value, len(index)) for value in column), dtype=np.intp, count=len(column)
+        )
+        values = list(index)
+        return cls(codes, values, [value.lower() for value in values])
+    
+    def family_bits(self, db, lower: bool = False) -> np.ndarray:
+        """Per-row bitmask of the Hyperscan database patterns matching each value"""
+        # The families are ASCII literals, which match UTF-8 bytes exactly as
+        # they match the str, so every value can be scanned
+        values = self.lowered if lower else self.values
+        bits = []
+        for value in values:
+            matched: list[int] = []
+            db.scan(value.encode('utf-8', 'surrogatepass'), match_event_handler=_on_hyperscan_match, context=matched)
+            bits.append(sum(1 << pattern_id for pattern_id in set(matched)))
+        return np.array(bits, dtype=np.uint8)[self.codes]
+    
+    def search(self, pattern: re.Pattern, lower: bool = False) -> np.ndarray:
+        """Boolean mask of rows containing a match for pattern"""
+        values = self.lowered if lower else self.values
+        hits = np.fromiter((pattern.search(value) is not None for value in values), dtype=bool, count=len(values))
+        return hits[self.codes]
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize column tables in simulation results as lists of rows"""
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('records')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def disk_memoize(directory: str = SIM_CACHE_DIR):
+    """Memoize a RuleSimulator method's results on disk by rule and logs
+    
+    Results are only cached when the simulator was given a logs_digest.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if os.environ.get(SIM_CACHE_DISABLE_ENV) or self._logs_digest is None:
+                return method(self, *args, **kwargs)
+            
+            try:
+                key = self._cache_key(method.__name__, self._logs_digest)
+            except TypeError:  # Rule is not JSON serializable
+                return method(self, *args, **kwargs)
+            path = os.path.join(directory, f'{key}.pkl')
+            
+            try:
+                with open(path, 'rb') as f:
+                    self.results, self._false_positive = pickle.load(f)
+                return self.results
+            except FileNotFoundError:
+                pass
+            except Exception as e:  # Corrupt, stale or from other library versions
+                print(f"Warning: ignoring unreadable simulation cache {path}: {e}")
+            
+            results = method(self, *args, **kwargs)
+            
+            # Write then rename so concurrent runs never read a partial file
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            try:
+                os.makedirs(directory, exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump((results, self._false_positive), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Warning: could not write simulation cache {path}: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            
+            return results
+        return wrapper
+    return decorator
 
 
 class RuleSimulator:
     """Simulate WAF rule impact on traffic logs"""
     
-    def __init__(self, logs: List[Dict[str, Any]], rule: Dict[str, Any]):
+    # Defaults applied to missing log fields before evaluation
+    FIELD_DEFAULTS = {
+        'path': '',
+        'query': '',
+        'userAgent': '',
+        'statusCode': 200,
+    }
+    
+    # Fields matched by regex, encoded once as _TextColumns
+    TEXT_FIELDS = ['path', 'query', 'userAgent']
+    
+    # Logs simulated per chunk by simulate_stream
+    STREAM_CHUNK_SIZE = 50000
+    
+    # Matched request detail columns, mapped to their log field
+    MATCHED_REQUEST_FIELDS = {
+        'timestamp': 'timestamp',
+        'ip': 'clientIP',
+        'path': 'path',
+        'method': 'method',
+        'statusCode': 'statusCode',
+    }
+    
+    def __init__(self, logs: list[dict[str, Any]], rule: dict[str, Any], logs_digest: bytes | None = None):
         self.logs = logs
         self.rule = rule
+        self._logs_digest = logs_digest
+        self._plan = self._compile_expression(rule.get('expression', ''))
         self.results = {
             'total_requests': len(logs),
             'matched': 0,
             'would_block': 0,
             'would_challenge': 0,
             'would_log': 0,
-            'matched_requests': [],
-            'false_positive_candidates': [],
+            'matched_requests': pd.DataFrame(columns=list(self.MATCHED_REQUEST_FIELDS), dtype=object),
+            'false_positive_candidates': 0,
         }
+        self._false_positive = np.zeros(len(logs), dtype=bool)
+    
+    # Columns are built on first use, so rules that enable no checks and
+    # the parent of simulate_parallel never pay for them
+    @cached_property
+    def df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.logs, columns=[*self.FIELD_DEFAULTS, 'country']).fillna(self.FIELD_DEFAULTS)
     
-    def simulate(self) -> Dict[str, Any]:
+    @cached_property
+    def _text(self) -> dict[str, _TextColumn]:
+        return {field: _TextColumn.encode(self.df[field]) for field in self.TEXT_FIELDS}
+    
+    @cached_property
+    def _url_family_bits(self) -> np.ndarray:
+        # One Hyperscan pass per distinct path/query covers every URL family
+        return (
+            self._text['path'].family_bits(_URL_FAMILIES_DB, lower=True)
+            | self._text['query'].family_bits(_URL_FAMILIES_DB, lower=True)
+        )
+    
+    def _cache_key(self, method_name: str, logs_digest: bytes) -> str:
+        """Hex key for a simulation method run on this rule and these logs"""
+        key = hashlib.sha256(_source_digest())
+        key.update(f'{method_name}:'.encode())
+        key.update(orjson.dumps(self.rule, option=orjson.OPT_SORT_KEYS))
+        key.update(logs_digest)
+        return key.hexdigest()
+    
+    @disk_memoize()
+    def simulate(self) -> dict[str, Any]:
         """Run simulation"""
-        expression = self.rule.get('expression', '')
+        return self._simulate()
+    
+    def _simulate(self) -> dict[str, Any]:
+        """Run simulation without the on-disk cache"""
+        if self._plan.is_empty():
+            return self._empty_result()
+        
         action = self.rule.get('action', 'log')
         
-        for log in self.logs:
-            if self._evaluate_expression(expression, log):
-                self.results['matched'] += 1
-                
-                # Track by action
-                if action == 'block':
-                    self.results['would_block'] += 1
-                elif action in ['challenge', 'js_challenge', 'managed_challenge']:
-                    self.results['would_challenge'] += 1
-                else:
-                    self.results['would_log'] += 1
-                
-                # Store matched request details
-                self.results['matched_requests'].append({
-                    'timestamp': log.get('timestamp'),
-                    'ip': log.get('clientIP'),
-                    'path': log.get('path'),
-                    'method': log.get('method'),
-                    'statusCode': log.get('statusCode'),
-                })
-                
-                # Detect potential false positives
-                if self._is_potential_false_positive(log):
-                    self.results['false_positive_candidates'].append(log)
-        
-        # Calculate rates
+        matched = self._evaluate_expression()
+        self._false_positive = matched & self._is_potential_false_positive()
+        
+        self.results['matched'] = int(matched.sum())
+        
+        # Track by action
+        if action == 'block':
+            self.results['would_block'] = self.results['matched']
+        elif action in ['challenge', 'js_challenge', 'managed_challenge']:
+            self.results['would_challenge'] = self.results['matched']
+        else:
+            self.results['would_log'] = self.results['matched']
+        
+        # Store matched request details as columns, expanded to rows on dump
+        matched_logs = [self.logs[i] for i in np.flatnonzero(matched)]
+        self.results['matched_requests'] = pd.DataFrame(
+            {
+                column: [log.get(field) for log in matched_logs]
+                for column, field in self.MATCHED_REQUEST_FIELDS.items()
+            },
+            columns=list(self.MATCHED_REQUEST_FIELDS),
+            dtype=object,
+        )
+        
+        # Detect potential false positives
+        self.results['false_positive_candidates'] = int(self._false_positive.sum())
+        
+        self._calculate_rates()
+        
+        return self.results
+    
+    @disk_memoize()
+    def simulate_parallel(self, workers: int | None = None) -> dict[str, Any]:
+        """Run simulation over shards of the logs in worker processes"""
+        if self._plan.is_empty():
+            return self._empty_result()
+        
+        workers = workers or os.cpu_count() or 1
+        
+        # Several shards per worker to even out uneven shard costs
+        shard_size = max(1, -(-len(self.logs) // (workers * 4)))
+        shards = [self.logs[i:i + shard_size] for i in range(0, len(self.logs), shard_size)]
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(_simulate_shard, shards, repeat(self.rule)))
+        
+        if partials:
+            self._false_positive = np.concatenate([false_positive for _, false_positive in partials])
+        
+        return self._merge_results([results for results, _ in partials])
+    
+    @classmethod
+    def simulate_stream(
+        cls,
+        logs: Iterable[dict[str, Any]],
+        rule: dict[str, Any],
+        chunk_size: int | None = None,
+        logs_digest: bytes | None = None,
+    ) -> RuleSimulator:
+        """Simulate rule over an iterable of logs, holding one chunk at a time
+        
+        The logs are not retained, so false_positive_candidates() is empty on
+        the returned simulator; results and generate_report() cover every log.
+        Results are only cached when logs_digest identifies the stream.
+        """
+        simulator = cls([], rule, logs_digest=logs_digest)
+        simulator._simulate_stream(logs, chunk_size)
+        return simulator
+    
+    @disk_memoize()
+    def _simulate_stream(self, logs: Iterable[dict[str, Any]], chunk_size: int | None) -> dict[str, Any]:
+        """Run simulation over streamed logs on a simulator created without logs"""
+        if self._plan.is_empty():
+            # Still consume the logs so total_requests is right
+            self.results['total_requests'] = sum(1 for _ in logs)
+            return self._empty_result()
+        
+        partials = [
+            RuleSimulator(chunk, self.rule)._simulate()
+            for chunk in _iter_chunks(logs, chunk_size or self.STREAM_CHUNK_SIZE)
+        ]
+        
+        return self._merge_results(partials)
+    
+    def _merge_results(self, partials: list[dict[str, Any]]) -> dict[str, Any]:
+        """Combine results of simulations over consecutive slices of logs"""
+        for key in ['total_requests', 'matched', 'would_block', 'would_challenge', 'would_log',
+                    'false_positive_candidates']:
+            self.results[key] = sum(results[key] for results in partials)
+        if partials:
+            self.results['matched_requests'] = pd.concat(
+                [results['matched_requests'] for results in partials], ignore_index=True
+            )
+        
+        self._calculate_rates()
+        
+        return self.results
+    
+    def _empty_result(self) -> dict[str, Any]:
+        """Zeroed results for an expression that can match nothing"""
+        for key in ['matched', 'would_block', 'would_challenge', 'would_log', 'false_positive_candidates']:
+            self.results[key] = 0
+        self.results['matched_requests'] = pd.DataFrame(columns=list(self.MATCHED_REQUEST_FIELDS), dtype=object)
+        self._false_positive = np.zeros(len(self.logs), dtype=bool)
+        
+        self._calculate_rates()
+        
+        return self.results
+    
+    def _calculate_rates(self):
+        """Calculate match and false positive rates from the counts"""
         total = self.results['total_requests']
         self.results['match_rate'] = round(self.results['matched'] / total * 100, 2) if total > 0 else 0
         self.results['false_positive_rate_estimate'] = round(
-            len(self.results['false_positive_candidates']) / self.results['matched'] * 100, 2
+            self.results['false_positive_candidates'] / self.results['matched'] * 100, 2
         ) if self.results['matched'] > 0 else 0
-        
-        return self.results
     
-    def _evaluate_expression(self, expression: str, log: Dict[str, Any]) -> bool:
-        """Evaluate Cloudflare expression against log entry"""
-        # Simplified expression evaluation
+    @staticmethod
+    def _compile_expression(expression: str) -> _ExpressionPlan:
+        """Parse Cloudflare expression into the checks it enables"""
+        # Simplified expression parsing
         # In production, use proper Cloudflare expression parser
         
-        path = log.get('path', '').lower()
-        query = log.get('query', '').lower()
-        full_url = f"{path}?{query}"
+        # First `eq "XX"` with a two-letter uppercase code
+        country = None
+        if 'ip.geoip.country' in expression:
+            start = expression.find('eq "')
+            while start >= 0:
+                code = expression[start + 4:start + 7]
+                if len(code) == 3 and 'A' <= code[0] <= 'Z' and 'A' <= code[1] <= 'Z' and code[2] == '"':
+                    country = code[:2]
+                    break
+                start = expression.find('eq "', start + 1)
+        
+        return _ExpressionPlan(
+            check_traversal='contains ".."' in expression or 'contains "%2e%2e"' in expression,
+            check_sqli='union select' in expression or 'drop table' in expression,
+            check_xss='<script' in expression or 'javascript:' in expression,
+            threat_gt=10 if 'cf.threat_score' in expression and 'gt 10' in expression else None,
+            bot_lt=30 if 'cf.bot_management.score' in expression and 'lt 30' in expression else None,
+            country=country,
+        )
+    
+    def false_positive_candidates(self) -> list[dict[str, Any]]:
+        """Matched logs flagged as potential false positives by the last simulate()"""
+        return [self.logs[i] for i in np.flatnonzero(self._false_positive)]
+    
+    def _evaluate_expression(self) -> np.ndarray:
+        """Evaluate compiled expression against every log entry"""
+        plan = self._plan
+        matched = np.zeros(len(self.df), dtype=bool)
+        
+        # None of the patterns can match across '?', so searching path and
+        # query separately is the same as searching f"{path}?{query}"
+        def url_search(pattern: re.Pattern) -> np.ndarray:
+            if _URL_FAMILIES_DB is not None:
+                return (self._url_family_bits & (1 << _URL_FAMILIES.index(pattern))) != 0
+            return self._text['path'].search(pattern, lower=True) | self._text['query'].search(pattern, lower=True)
         
         # Path traversal
-        if 'contains ".."' in expression or 'contains "%2e%2e"' in expression:
-            if '..' in full_url or '%2e%2e' in full_url:
-                return True
+        if plan.check_traversal:
+            matched |= url_search(_TRAVERSAL_RE)
         
         # SQL injection
-        if 'union select' in expression or 'drop table' in expression:
-            if any(pattern in full_url for pattern in ['union select', 'drop table', "' or '1'='1"]):
-                return True
+        if plan.check_sqli:
+            matched |= url_search(_SQLI_RE)
         
         # XSS
-        if '<script' in expression or 'javascript:' in expression:
-            if any(pattern in full_url for pattern in ['<script', 'javascript:', 'onerror=']):
-                return True
+        if plan.check_xss:
+            matched |= url_search(_XSS_RE)
         
         # Threat score (mock)
-        if 'cf.threat_score' in expression:
+        if plan.threat_gt is not None:
             # Simulate threat score based on heuristics
-            threat_score = self._calculate_mock_threat_score(log)
-            if 'gt 10' in expression and threat_score > 10:
-                return True
+            matched |= self._calculate_mock_threat_score() > plan.threat_gt
         
         # Bot score (mock)
-        if 'cf.bot_management.score' in expression:
-            bot_score = self._calculate_mock_bot_score(log)
-            if 'lt 30' in expression and bot_score < 30:
-                return True
+        if plan.bot_lt is not None:
+            matched |= self._calculate_mock_bot_score() < plan.bot_lt
         
         # Country filter
-        if 'ip.geoip.country' in expression:
-            country_match = re.search(r'eq "([A-Z]{2})"', expression)
-            if country_match:
-                target_country = country_match.group(1)
-                if log.get('country') == target_country:
-                    return True
+        if plan.country is not None:
+            matched |= (self.df['country'] == plan.country).to_numpy()
         
-        return False
+        return matched
     
-    def _calculate_mock_threat_score(self, log: Dict[str, Any]) -> int:
+    def _calculate_mock_threat_score(self) -> np.ndarray:
         """Calculate mock threat score"""
-        score = 0
-        
-        path = log.get('path', '').lower()
-        if any(suspicious in path for suspicious in ['admin', 'wp-', 'phpmyadmin', '.env']):
-            score += 20
-        
-        if log.get('statusCode', 200) >= 400:
-            score += 10
-        
-        user_agent = log.get('userAgent', '').lower()
-        if 'bot' in user_agent or 'curl' in user_agent:
-            score += 15
+        score = np.zeros(len(self.df), dtype=np.int64)
+        score += 20 * self._text['path'].search(_SUSPICIOUS_PATH_RE, lower=True)
+        score += 10 * (self.df['statusCode'] >= 400).to_numpy()
+        score += 15 * self._text['userAgent'].search(_THREAT_UA_RE, lower=True)
         
         return score
     
-    def _calculate_mock_bot_score(self, log: Dict[str, Any]) -> int:
+    def _calculate_mock_bot_score(self) -> np.ndarray:
         """Calculate mock bot score (0-100, lower = more bot-like)"""
-        user_agent = log.get('userAgent', '').lower()
-        
-        if any(bot in user_agent for bot in ['bot', 'crawler', 'spider']):
-            return 10
-        elif 'curl' in user_agent or 'wget' in user_agent:
-            return 5
-        elif len(user_agent) < 20:
-            return 25
-        else:
-            return 80  # Likely human
+        user_agent = self._text['userAgent']
+        # Length of the lowercased user agent, which can differ from the raw one
+        lowered_len = np.fromiter(map(len, user_agent.lowered), dtype=np.int64, count=len(user_agent.lowered))
+        
+        return np.select(
+            [
+                user_agent.search(_BOT_UA_RE, lower=True),
+                user_agent.search(_SCRIPT_TOOL_RE, lower=True),
+                lowered_len[user_agent.codes] < 20,
+            ],
+            [10, 5, 25],
+            default=80,  # Likely human
+        )
     
-    def _is_potential_false_positive(self, log: Dict[str, Any]) -> bool:
+    def _is_potential_false_positive(self) -> np.ndarray:
         """Detect potential false positives"""
         # Heuristics for legitimate traffic
-        path = log.get('path', '')
-        status = log.get('statusCode', 200)
-        
         # Successful requests to common paths might be legitimate
-        if status == 200 and any(common in path for common in ['/api/', '/static/', '/assets/']):
-            return True
+        common_path = (self.df['statusCode'] == 200).to_numpy() & self._text['path'].search(_COMMON_PATH_RE)
         
         # Check if user agent looks legitimate
-        user_agent = log.get('userAgent', '')
-        if any(browser in user_agent for browser in ['Chrome/', 'Firefox/', 'Safari/']):
-            # Check for version numbers (legitimate browsers have them)
-            if re.search(r'\d+\.\d+', user_agent):
-                return True
+        # (legitimate browsers have version numbers)
+        user_agent = self._text['userAgent']
+        browser = user_agent.search(_BROWSER_RE)
+        versioned = user_agent.search(_VERSION_RE)
         
-        return False
+        return common_path | (browser & versioned)
     
     def generate_report(self) -> str:
         """Generate simulation report"""
-        report = []
-        report.append("=" * 80)
-        report.append("WAF RULE SIMULATION REPORT")
-        report.append("=" * 80)
-        report.append("")
-        
-        report.append("RULE DETAILS")
-        report.append("-" * 80)
-        report.append(f"Expression: {self.rule.get('expression')}")
-        report.append(f"Action: {self.rule.get('action')}")
-        report.append(f"Description: {self.rule.get('description')}")
-        report.append("")
-        
-        report.append("SIMULATION RESULTS")
-        report.append("-" * 80)
-        report.append(f"Total Requests Analyzed: {self.results['total_requests']}")
-        report.append(f"Matched Requests: {self.results['matched']} ({self.results['match_rate']}%)")
-        report.append(f"Would Block: {self.results['would_block']}")
-        report.append(f"Would Challenge: {self.results['would_challenge']}")
-        report.append(f"Would Log: {self.results['would_log']}")
-        report.append("")
-        
-        report.append("FALSE POSITIVE ANALYSIS")
-        report.append("-" * 80)
-        report.append(f"Potential False Positives: {len(self.results['false_positive_candidates'])}")
-        report.append(f"Estimated FP Rate: {self.results['false_positive_rate_estimate']}%")
-        
-        if self.results['false_positive_rate_estimate'] > 10:
-            report.append("\n⚠️  WARNING: High false positive rate detected!")
-            report.append("Consider refining the rule expression before deployment.")
+        rule = self.rule
+        results = self.results
+        
+        if results['false_positive_rate_estimate'] > 10:
+            assessment = (
+                "⚠️  WARNING: High false positive rate detected!\n"
+                "Consider refining the rule expression before deployment."
+            )
         else:
-            report.append("\n✓ False positive rate is acceptable")
-        
-        report.append("")
-        report.append("=" * 80)
-        
-        return "\n".join(report)
+            assessment = "✓ False positive rate is acceptable"
+        
+        return (
+            f"{'=' * 80}\n"
+            "WAF RULE SIMULATION REPORT\n"
+            f"{'=' * 80}\n"
+            "\n"
+            "RULE DETAILS\n"
+            f"{'-' * 80}\n"
+            f"Expression: {rule.get('expression')}\n"
+            f"Action: {rule.get('action')}\n"
+            f"Description: {rule.get('description')}\n"
+            "\n"
+            "SIMULATION RESULTS\n"
+            f"{'-' * 80}\n"
+            f"Total Requests Analyzed: {results['total_requests']}\n"
+            f"Matched Requests: {results['matched']} ({results['match_rate']}%)\n"
+            f"Would Block: {results['would_block']}\n"
+            f"Would Challenge: {results['would_challenge']}\n"
+            f"Would Log: {results['would_log']}\n"
+            "\n"
+            "FALSE POSITIVE ANALYSIS\n"
+            f"{'-' * 80}\n"
+            f"Potential False Positives: {results['false_positive_candidates']}\n"
+            f"Estimated FP Rate: {results['false_positive_rate_estimate']}%\n"
+            "\n"
+            f"{assessment}\n"
+            "\n"
+            f"{'=' * 80}"
+        )
+
+
+def _iter_chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Group items into lists of at most `size`"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _is_json_array(path: str) -> bool:
+    """True if the JSON document in path is a top-level array"""
+    # Read small blocks so a minified single-line file is not loaded whole
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(4096), b''):
+            stripped = block.lstrip(b' \t\r\n')
+            if stripped:
+                return stripped.startswith(b'[')
+    return False
+
+
+def _file_digest(path: str) -> bytes:
+    """Digest identifying a file's current contents by path, size and mtime"""
+    stat = os.stat(path)
+    return hashlib.sha256(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).digest()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_digest() -> bytes:
+    """Digest of this module's source, read once per process"""
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def _simulate_shard(logs: list[dict[str, Any]], rule: dict[str, Any]) -> tuple[dict[str, Any], np.ndarray]:
+    """Simulate rule on one shard of logs in a worker process"""
+    simulator = RuleSimulator(logs, rule)
+    return simulator._simulate(), simulator._false_positive
 
 
 def main():
@@ -213,24 +592,34 @@ def main():
     rule_file = sys.argv[2]
     
     try:
-        with open(log_file, 'r') as f:
-            logs = json.load(f)
-        
-        with open(rule_file, 'r') as f:
-            rule = json.load(f)
-        
-        if not isinstance(logs, list):
-            logs = [logs]
-        
-        simulator = RuleSimulator(logs, rule)
-        results = simulator.simulate()
+        with open(rule_file, 'rb') as f:
+            rule = orjson.loads(f.read())
+        
+        logs_digest = _file_digest(log_file)
+        
+        if ijson is not None and _is_json_array(log_file):
+            # Stream the log array so it is never held in memory at once
+            with open(log_file, 'rb') as f:
+                simulator = RuleSimulator.simulate_stream(
+                    ijson.items(f, 'item', use_float=True), rule, logs_digest=logs_digest
+                )
+            results = simulator.results
+        else:
+            with open(log_file, 'rb') as f:
+                logs = orjson.loads(f.read())
+            
+            if not isinstance(logs, list):
+                logs = [logs]
+            
+            simulator = RuleSimulator(logs, rule, logs_digest=logs_digest)
+            results = simulator.simulate()
         
         print(simulator.generate_report())
         
         # Save detailed results
         output_file = rule_file.replace('.json', '_simulation_results.json')
-        with open(output_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(results, default=_json_default, option=orjson.OPT_INDENT_2))
         
         print(f"\nDetailed results saved to: {output_file}")
         
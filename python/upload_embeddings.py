@@ -3,45 +3,94 @@
 Upload embeddings to Vectorize via Worker endpoint
 """
 
-import json
+import itertools
+import orjson
 import requests
 import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
 
 WORKER_URL = 'http://localhost:8787'
 EMBEDDINGS_FILE = '../data/embeddings.jsonl'
+UPLOAD_BATCH_SIZE = 500
+MAX_IN_FLIGHT = 8  # Concurrent batch uploads
 
-def load_documents():
-    """Load documents from embeddings.jsonl"""
-    documents = []
-    with open(EMBEDDINGS_FILE, 'r') as f:
+def iter_documents():
+    """Yield documents from embeddings.jsonl one line at a time"""
+    with open(EMBEDDINGS_FILE, 'rb') as f:
         for line in f:
             if line.strip():
-                documents.append(json.loads(line))
-    return documents
+                yield orjson.loads(line)
 
-def main():
-    print("Loading documents...")
-    documents = load_documents()
-    print(f"Loaded {len(documents)} documents")
-    
-    print(f"\nUploading to {WORKER_URL}/admin/populate-embeddings...")
-    
-    response = requests.post(
+def iter_batches(documents, size):
+    """Group documents into lists of at most `size`"""
+    documents = iter(documents)
+    while True:
+        batch = list(itertools.islice(documents, size))
+        if not batch:
+            return
+        yield batch
+
+def upload_batch(session, batch):
+    """POST one batch of documents to the Worker"""
+    return session.post(
         f'{WORKER_URL}/admin/populate-embeddings',
-        json={'documents': documents},
+        data=orjson.dumps({'documents': batch}),
         headers={'Content-Type': 'application/json'}
     )
+
+def main():
+    print(f"Uploading {EMBEDDINGS_FILE} to {WORKER_URL}/admin/populate-embeddings "
+          f"in batches of {UPLOAD_BATCH_SIZE}...")
+    
+    processed = 0
+    uploaded = 0
+    failed = []
     
-    if response.status_code == 200:
-        result = response.json()
-        print(f"\n✅ Success!")
-        print(f"  Processed: {result['processed']}")
-        print(f"  Uploaded: {result['uploaded']}")
-        print(f"  Message: {result['message']}")
-    else:
-        print(f"\n❌ Error: {response.status_code}")
-        print(response.text)
+    # Keep-alive connections shared by the in-flight uploads
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT) as executor:
+        adapter = HTTPAdapter(pool_connections=MAX_IN_FLIGHT, pool_maxsize=MAX_IN_FLIGHT)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        
+        pending = {}
+        
+        def collect(done):
+            nonlocal processed, uploaded
+            for future in done:
+                batch_num = pending.pop(future)
+                response = future.result()
+                if response.status_code != 200:
+                    failed.append((batch_num, response))
+                    continue
+                result = response.json()
+                processed += result['processed']
+                uploaded += result['uploaded']
+                print(f"  Batch {batch_num}: {result['uploaded']}/{result['processed']} uploaded")
+        
+        # Read ahead only as far as the in-flight window so memory stays bounded
+        for batch_num, batch in enumerate(iter_batches(iter_documents(), UPLOAD_BATCH_SIZE), 1):
+            if len(pending) >= MAX_IN_FLIGHT:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            if failed:
+                break
+            pending[executor.submit(upload_batch, session, batch)] = batch_num
+        
+        collect(list(pending))
+    
+    if failed:
+        for batch_num, response in sorted(failed, key=lambda item: item[0]):
+            print(f"\n❌ Error in batch {batch_num}: {response.status_code}")
+            print(response.text)
+        print(f"  Processed before failure: {processed}")
+        print(f"  Uploaded before failure: {uploaded}")
         sys.exit(1)
+    
+    print(f"\n✅ Success!")
+    print(f"  Processed: {processed}")
+    print(f"  Uploaded: {uploaded}")
+    print(f"  Message: Successfully uploaded {uploaded} embeddings to Vectorize")
 
 if __name__ == '__main__':
     main()